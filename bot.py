@@ -4,11 +4,14 @@ Handles all Telegram interactions and message sending
 """
 
 import os
+import asyncio
 import logging
 import tempfile
-import shutil
+import weakref
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import (
+    AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ContextTypes
+)
 from extractor import extract_mcqs_from_pdf
 
 # Configure logging
@@ -21,6 +24,49 @@ logger = logging.getLogger(__name__)
 # Bot token - replace with your actual token
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Telegram rejects text messages longer than 4096 characters
+MAX_MESSAGE_LENGTH = 4000
+
+# Updates run concurrently, so uploads are serialized per chat to keep
+# one file's questions from interleaving with another's. Handlers hold
+# their chat's lock, and the entry disappears once none of them do.
+chat_locks = weakref.WeakValueDictionary()
+
+
+class MessageBatcher:
+    """Combine consecutive text messages into as few Telegram messages as possible"""
+    
+    def __init__(self, update: Update):
+        self.update = update
+        self.parts = []
+        self.length = 0
+    
+    async def add(self, text: str) -> None:
+        """Queue a text message, sending the batch first if it would overflow"""
+        if self.parts and self.length + len(text) > MAX_MESSAGE_LENGTH:
+            await self.flush()
+        
+        self.parts.append(text)
+        self.length += len(text) + 2
+    
+    async def flush(self) -> None:
+        """Send all queued text as a single message"""
+        if not self.parts:
+            return
+        
+        await self.update.message.reply_text("\n\n".join(self.parts), parse_mode='Markdown')
+        self.parts = []
+        self.length = 0
+
+
+def get_chat_lock(chat_id: int) -> asyncio.Lock:
+    """Return the upload lock for a chat, creating it if no handler holds one"""
+    lock = chat_locks.get(chat_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        chat_locks[chat_id] = lock
+    return lock
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send welcome message when /start command is issued"""
@@ -53,55 +99,54 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
     
-    # Create temporary directory for processing
-    temp_dir = tempfile.mkdtemp()
-    pdf_path = os.path.join(temp_dir, document.file_name)
-    
-    try:
-        # Download the PDF
-        await update.message.reply_text("📥 Downloading your file...")
-        file = await document.get_file()
-        await file.download_to_drive(pdf_path)
-        
-        # Extract MCQs
-        await update.message.reply_text("🧠 Extracting MCQs, please wait...")
-        logger.info(f"Processing PDF: {document.file_name}")
-        
-        extracted_data = extract_mcqs_from_pdf(pdf_path, temp_dir)
-        
-        # Check if extraction was successful
-        if not extracted_data:
-            await update.message.reply_text(
-                "⚠️ Could not extract MCQs. Please try another file.\n\n"
-                "Make sure your PDF contains:\n"
-                "• Clear question numbers\n"
-                "• Multiple choice options (A, B, C, D)\n"
-                "• Readable text (not scanned images)"
-            )
-            return
-        
-        # Send extracted content
-        await send_extracted_content(update, extracted_data)
-        await update.message.reply_text("✅ Extraction complete!")
-        
-    except Exception as e:
-        logger.error(f"Error processing PDF: {str(e)}")
-        await update.message.reply_text(
-            "❌ An error occurred while processing your file.\n"
-            "Please try again or send a different PDF."
-        )
-    
-    finally:
-        # Clean up temporary files
-        try:
-            shutil.rmtree(temp_dir)
-            logger.info(f"Cleaned up temporary directory: {temp_dir}")
-        except Exception as e:
-            logger.error(f"Error cleaning up temp directory: {str(e)}")
+    # Process one upload per chat at a time
+    async with get_chat_lock(update.effective_chat.id):
+        # Create temporary directory for processing; it is removed on exit,
+        # including when the handler is cancelled
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as temp_dir:
+            pdf_path = os.path.join(temp_dir, document.file_name)
+            
+            try:
+                # Download the PDF
+                await update.message.reply_text("📥 Downloading your file...")
+                file = await document.get_file()
+                await file.download_to_drive(pdf_path)
+                
+                # Extract MCQs
+                await update.message.reply_text("🧠 Extracting MCQs, please wait...")
+                logger.info(f"Processing PDF: {document.file_name}")
+                
+                # Run the blocking PDF work off the event loop so other chats stay responsive
+                extracted_data = await asyncio.to_thread(extract_mcqs_from_pdf, pdf_path, temp_dir)
+                
+                # Check if extraction was successful
+                if not extracted_data:
+                    await update.message.reply_text(
+                        "⚠️ Could not extract MCQs. Please try another file.\n\n"
+                        "Make sure your PDF contains:\n"
+                        "• Clear question numbers\n"
+                        "• Multiple choice options (A, B, C, D)\n"
+                        "• Readable text (not scanned images)"
+                    )
+                    return
+                
+                # Send extracted content
+                await send_extracted_content(update, extracted_data)
+                await update.message.reply_text("✅ Extraction complete!")
+                
+            except Exception as e:
+                logger.error(f"Error processing PDF: {str(e)}")
+                await update.message.reply_text(
+                    "❌ An error occurred while processing your file.\n"
+                    "Please try again or send a different PDF."
+                )
 
 
 async def send_extracted_content(update: Update, data: list) -> None:
     """Send extracted MCQs to the chat in a formatted manner"""
+    batcher = MessageBatcher(update)
+    # Telegram file_ids of images already uploaded to this chat, by path
+    photo_ids = {}
     
     for topic_data in data:
         topic = topic_data.get('topic', 'General Questions')
@@ -112,54 +157,63 @@ async def send_extracted_content(update: Update, data: list) -> None:
         
         # Send topic header
         topic_message = f"📘 **Topic: {topic}**\n{'─' * 40}"
-        await update.message.reply_text(topic_message, parse_mode='Markdown')
+        await batcher.add(topic_message)
         
         # Send each question
         for idx, q in enumerate(questions, 1):
-            await send_single_question(update, q, idx)
+            await send_single_question(update, batcher, photo_ids, q, idx)
         
         # Add spacing between topics
-        await update.message.reply_text("━" * 40)
+        await batcher.add("━" * 40)
+    
+    await batcher.flush()
 
 
-async def send_single_question(update: Update, question_data: dict, q_num: int) -> None:
+async def send_single_question(update: Update, batcher: MessageBatcher, photo_ids: dict,
+                               question_data: dict, q_num: int) -> None:
     """Send a single MCQ with all its components"""
     
     # Build question text
-    question_text = f"❓ **Q{q_num}. {question_data.get('question', 'Question text not found')}**\n\n"
+    parts = [f"❓ **Q{q_num}. {question_data.get('question', 'Question text not found')}**\n\n"]
     
     # Add options
     options = question_data.get('options', [])
     option_labels = ['A)', 'B)', 'C)', 'D)', 'E)', 'F)']
     
-    for i, option in enumerate(options):
-        if i < len(option_labels):
-            question_text += f"{option_labels[i]} {option}\n"
+    parts.extend(f"{label} {option}\n" for label, option in zip(option_labels, options))
     
     # Add correct answer
     answer = question_data.get('answer')
     if answer:
-        question_text += f"\n✅ **Correct Answer:** {answer}"
+        parts.append(f"\n✅ **Correct Answer:** {answer}")
+    
+    question_text = "".join(parts)
     
     # Send question text
-    await update.message.reply_text(question_text, parse_mode='Markdown')
+    await batcher.add(question_text)
     
-    # Send image if available
+    # Send image if available (the extractor only sets paths it has saved)
     image_path = question_data.get('image')
-    if image_path and os.path.exists(image_path):
+    if image_path:
+        # Images can't be batched, so send the queued text ahead of them
+        await batcher.flush()
         try:
-            with open(image_path, 'rb') as img_file:
-                await update.message.reply_photo(photo=img_file, caption="🖼️ Question Image")
+            if image_path in photo_ids:
+                # Reuse the earlier upload instead of sending the bytes again
+                await update.message.reply_photo(photo=photo_ids[image_path], caption="🖼️ Question Image")
+            else:
+                with open(image_path, 'rb') as img_file:
+                    message = await update.message.reply_photo(photo=img_file, caption="🖼️ Question Image")
+                photo_ids[image_path] = message.photo[-1].file_id
+        except FileNotFoundError:
+            logger.error(f"Question image not found: {image_path}")
         except Exception as e:
             logger.error(f"Error sending image: {str(e)}")
     
     # Send video link if available
     video_link = question_data.get('video_link')
     if video_link:
-        await update.message.reply_text(
-            f"🎥 **Watch Explanation Video:**\n{video_link}",
-            parse_mode='Markdown'
-        )
+        await batcher.add(f"🎥 **Watch Explanation Video:**\n{video_link}")
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -174,8 +228,15 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 def main() -> None:
     """Start the bot"""
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Create application, handling updates concurrently and keeping sends
+    # within Telegram's flood limits
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .rate_limiter(AIORateLimiter())
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
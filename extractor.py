@@ -5,12 +5,63 @@ Handles PDF parsing and MCQ extraction logic
 
 import re
 import os
+import multiprocessing
 import fitz  # PyMuPDF
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
 import logging
 
+# Use Google's RE2 (linear-time DFA matching) for the hot line classifiers
+# when it is installed, falling back to the standard library engine
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
 logger = logging.getLogger(__name__)
 
+# Character classes chosen so that RE2 and re match identically: RE2's
+# \d and \s are ASCII-only while re's are Unicode-aware, and under (?i) re
+# also folds "i" to the Turkish dotted and dotless I, which RE2 does not
+_DIGIT = r'\p{Nd}' if _re_engine is not re else r'\d'
+_SPACE = '[\t\n\v\f\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+_I = '[i\u0130\u0131]'
+
+# Precompiled patterns used by the line classifiers and cleaners
+# Q1. / Q1: / Q1) / Q. / Q: / 1. / 1: / 1) / Question / Question 1.
+_Q_RE = _re_engine.compile(
+    rf'(?i)^(?:Q{_DIGIT}*[.:)]|{_DIGIT}+[.:)]|Quest{_I}on{_SPACE}*{_DIGIT}*[.:])'
+)
+
+# (a) / A. / a) / (1) / 1. / 1) / [A]
+_OPT_RE = _re_engine.compile(rf'^(?:\(?[A-Fa-f][).]|\(?{_DIGIT}+[).]|\[[A-Fa-f]\])')
+
+_TOPIC_IND_RE = _re_engine.compile(rf'(?i)chapter|un{_I}t|sect{_I}on|top{_I}c|part')
+_ANS_IND_RE = _re_engine.compile(
+    rf'(?i)answer|correct answer|correct opt{_I}on|ans[:.]|solut{_I}on|correct:'
+)
+
+# Hyperlinks worth forwarding as explanation videos
+_VIDEO_RE = _re_engine.compile(rf'(?i)youtube|v{_I}deo|watch|explanat{_I}on')
+
+# Minimum number of pages per worker process; PDFs too short to give two
+# workers this many pages are processed in the calling process
+PAGES_PER_PROCESS = 25
+
+# Number of threads writing extracted images to disk
+IMAGE_WRITER_THREADS = 4
+
+# Characters that rule out the short-heading topic heuristic
+_TOPIC_REJECT_CHARS = frozenset('?()')
+
+# The cleaners always use re, so its Unicode-aware \d and \s match the
+# classifiers above under either engine
+_CLEAN_TOPIC = re.compile(r'^(chapter|unit|section|topic|part)\s*\d*[\:\.]?\s*', re.IGNORECASE)
+_CLEAN_Q1 = re.compile(r'^(Q|Question)\s*\d*[\.\:\)]\s*', re.IGNORECASE)
+_CLEAN_Q2 = re.compile(r'^\d+[\.\:\)]\s*')
+_CLEAN_OPT = re.compile(r'^[\(\[]?[A-Fa-f\d][\)\.\]]\s*')
+_CLEAN_ANS = re.compile(r'^(answer|correct answer|correct option|ans|solution|correct)[\:\.]?\s*', re.IGNORECASE)
+
 
 def extract_mcqs_from_pdf(pdf_path: str, temp_dir: str) -> list:
     """
@@ -24,27 +75,30 @@ def extract_mcqs_from_pdf(pdf_path: str, temp_dir: str) -> list:
         List of dictionaries containing topics and questions
     """
     try:
-        doc = fitz.open(pdf_path)
-        logger.info(f"Opened PDF with {len(doc)} pages")
+        with fitz.open(pdf_path, filetype="pdf") as doc:
+            page_count = len(doc)
+            logger.info(f"Opened PDF with {page_count} pages")
+            
+            # Only split large PDFs across processes; for short ones the
+            # process startup costs more than it saves
+            workers = min(os.cpu_count() or 1, page_count // PAGES_PER_PROCESS)
+            if workers <= 1:
+                results = process_pages(doc, range(page_count), temp_dir)
+        
+        if workers > 1:
+            results = process_pages_in_parallel(pdf_path, page_count, workers, temp_dir)
         
-        # Extract all text and metadata
-        full_text = ""
+        # Reassemble page results in document order
+        text_parts = []
         images = []
         links = []
         
-        for page_num, page in enumerate(doc):
-            # Extract text
-            full_text += page.get_text()
-            
-            # Extract images
-            page_images = extract_images_from_page(page, page_num, temp_dir)
+        for page_num, page_text, page_images, page_links in results:
+            text_parts.append(page_text)
             images.extend(page_images)
-            
-            # Extract links
-            page_links = extract_links_from_page(page)
             links.extend(page_links)
         
-        doc.close()
+        full_text = "".join(text_parts)
         
         # Parse the text to extract structured MCQ data
         structured_data = parse_mcqs(full_text, images, links)
@@ -57,25 +111,112 @@ def extract_mcqs_from_pdf(pdf_path: str, temp_dir: str) -> list:
         return []
 
 
-def extract_images_from_page(page, page_num: int, temp_dir: str) -> list:
-    """Extract images from a PDF page and save them"""
+def process_pages_in_parallel(pdf_path: str, page_count: int, workers: int,
+                              temp_dir: str) -> list:
+    """
+    Process the pages of a PDF in contiguous batches across worker processes
+    
+    PyMuPDF keeps the GIL and a single-threaded MuPDF context for the whole
+    interpreter, so threads cannot overlap its work; each process has its own.
+    
+    Returns:
+        List of process_page results, in page order
+    """
+    batch_size = -(-page_count // workers)
+    
+    # Spawn rather than fork, since the caller may be running other threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(process_page_batch, pdf_path,
+                            range(start, min(start + batch_size, page_count)), temp_dir)
+            for start in range(0, page_count, batch_size)
+        ]
+        # Batches are contiguous, so collecting them in order keeps page order
+        return [page_result for future in futures for page_result in future.result()]
+
+
+def process_page_batch(pdf_path: str, page_nums: range, temp_dir: str) -> list:
+    """Open the PDF once in a worker process and process a range of its pages"""
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return process_pages(doc, page_nums, temp_dir)
+
+
+def process_pages(doc, page_nums: range, temp_dir: str) -> list:
+    """
+    Extract text, images, and links from a range of pages of an open document
+    
+    Image files are written on a small thread pool, which unlike PyMuPDF
+    releases the GIL, and are all on disk once this returns. Images that
+    repeat within the range are extracted only once.
+    
+    Returns:
+        List of process_page results, in page order
+    """
+    # Images already saved, by xref, so repeated graphics are decoded once
+    seen_xrefs = {}
+    
+    with ThreadPoolExecutor(max_workers=IMAGE_WRITER_THREADS) as image_writer:
+        results = [process_page(doc[page_num], page_num, temp_dir, image_writer, seen_xrefs)
+                   for page_num in page_nums]
+    
+    return results
+
+
+def process_page(page, page_num: int, temp_dir: str,
+                 image_writer: ThreadPoolExecutor = None,
+                 seen_xrefs: dict = None) -> tuple:
+    """
+    Extract text, images, and links from a single PDF page
+    
+    Returns:
+        Tuple of (page_num, text, images, links)
+    """
+    text = page.get_text()
+    
+    images = extract_images_from_page(page, page_num, temp_dir, image_writer, seen_xrefs)
+    links = extract_links_from_page(page)
+    
+    return page_num, text, images, links
+
+
+def extract_images_from_page(page, page_num: int, temp_dir: str,
+                             image_writer: ThreadPoolExecutor = None,
+                             seen_xrefs: dict = None) -> list:
+    """
+    Extract images from a PDF page and save them
+    
+    If image_writer is given, the files are written asynchronously on it
+    and are only guaranteed to exist once the executor has shut down.
+    seen_xrefs maps image xrefs to paths already saved from earlier pages;
+    images found there are reused instead of extracted again.
+    """
     images = []
+    if seen_xrefs is None:
+        seen_xrefs = {}
     
     try:
         image_list = page.get_images(full=True)
         
         for img_index, img in enumerate(image_list):
             xref = img[0]
-            base_image = page.parent.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
+            image_path = seen_xrefs.get(xref)
             
-            # Save image to temp directory
-            image_filename = f"page{page_num}_img{img_index}.{image_ext}"
-            image_path = os.path.join(temp_dir, image_filename)
-            
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_bytes)
+            if image_path is None:
+                base_image = page.parent.extract_image(xref)
+                image_bytes = base_image["image"]
+                image_ext = base_image["ext"]
+                
+                # Save image to temp directory
+                image_filename = f"page{page_num}_img{img_index}.{image_ext}"
+                image_path = os.path.join(temp_dir, image_filename)
+                
+                if image_writer:
+                    image_writer.submit(write_image, image_path, image_bytes)
+                else:
+                    write_image(image_path, image_bytes)
+                
+                seen_xrefs[xref] = image_path
             
             images.append({
                 'page': page_num,
@@ -89,10 +230,22 @@ def extract_images_from_page(page, page_num: int, temp_dir: str) -> list:
     return images
 
 
+def write_image(image_path: str, image_bytes: bytes) -> None:
+    """Write extracted image bytes to disk"""
+    try:
+        Path(image_path).write_bytes(image_bytes)
+    except Exception as e:
+        logger.error(f"Error writing image {image_path}: {str(e)}")
+
+
 def extract_links_from_page(page) -> list:
     """Extract hyperlinks from a PDF page"""
     links = []
     
+    # Most pages carry no links at all; skip building the link list for them
+    if not page.first_link:
+        return links
+    
     try:
         link_list = page.get_links()
         
@@ -100,7 +253,7 @@ def extract_links_from_page(page) -> list:
             if 'uri' in link:
                 uri = link['uri']
                 # Check if it's a video or explanation link
-                if any(keyword in uri.lower() for keyword in ['youtube', 'video', 'watch', 'explanation']):
+                if _VIDEO_RE.search(uri):
                     links.append(uri)
                     
     except Exception as e:
@@ -121,15 +274,14 @@ def parse_mcqs(text: str, images: list, links: list) -> list:
     Returns:
         Structured list of topics and questions
     """
-    lines = text.split('\n')
+    lines = text.splitlines()
     structured_data = []
     current_topic = None
     current_question = None
     current_options = []
-    question_counter = 0
     image_counter = 0
     
-    for i, line in enumerate(lines):
+    for line in lines:
         line = line.strip()
         
         if not line:
@@ -169,29 +321,31 @@ def parse_mcqs(text: str, images: list, links: list) -> list:
                 'video_link': None
             }
             current_options = []
-            question_counter += 1
+            continue
+        
+        # Options, answers and continuations only belong inside a question
+        if not current_question:
             continue
         
         # Detect options
-        if current_question and is_option(line):
+        if is_option(line):
             option_text = clean_option(line)
             current_options.append(option_text)
             continue
         
         # Detect answer
-        if current_question and is_answer(line):
+        if is_answer(line):
             answer_text = clean_answer(line)
             current_question['answer'] = answer_text
             continue
         
-        # If it's a continuation of question or option, append it
-        if current_question and not is_option(line) and not is_answer(line):
-            if current_options:
-                # Append to last option
-                current_options[-1] += " " + line
-            elif current_question['question']:
-                # Append to question
-                current_question['question'] += " " + line
+        # Otherwise it's a continuation of the question or last option
+        if current_options:
+            # Append to last option
+            current_options[-1] += " " + line
+        elif current_question['question']:
+            # Append to question
+            current_question['question'] += " " + line
     
     # Save last question
     if current_question:
@@ -215,12 +369,11 @@ def is_topic(line: str) -> bool:
         return True
     
     # Contains topic indicators
-    topic_indicators = ['chapter', 'unit', 'section', 'topic', 'part']
-    if any(indicator in line.lower() for indicator in topic_indicators):
+    if _TOPIC_IND_RE.search(line):
         return True
     
     # Short bold-like text (heuristic: short lines that aren't questions)
-    if len(line) < 50 and not any(char in line for char in ['?', '(', ')']):
+    if len(line) < 50 and _TOPIC_REJECT_CHARS.isdisjoint(line):
         if not line[0].isdigit() and ':' not in line:
             return True
     
@@ -230,16 +383,8 @@ def is_topic(line: str) -> bool:
 def is_question(line: str) -> bool:
     """Check if a line is a question"""
     # Starts with Q, Q., Question, or a number followed by dot/parenthesis
-    question_patterns = [
-        r'^Q\d+[\.\:)]',  # Q1. or Q1: or Q1)
-        r'^Q[\.\:)]',     # Q. or Q:
-        r'^\d+[\.\:)]',   # 1. or 1: or 1)
-        r'^Question\s*\d*[\.\:]',  # Question or Question 1.
-    ]
-    
-    for pattern in question_patterns:
-        if re.match(pattern, line, re.IGNORECASE):
-            return True
+    if _Q_RE.match(line):
+        return True
     
     # Contains question mark
     if '?' in line:
@@ -251,56 +396,40 @@ def is_question(line: str) -> bool:
 def is_option(line: str) -> bool:
     """Check if a line is an option"""
     # Patterns like (a), A., 1), [A], etc.
-    option_patterns = [
-        r'^[\(]?[A-Fa-f][\)\.]',  # (a) or A. or a)
-        r'^[\(]?\d+[\)\.]',        # (1) or 1. or 1)
-        r'^\[[A-Fa-f]\]',         # [A]
-    ]
-    
-    for pattern in option_patterns:
-        if re.match(pattern, line):
-            return True
-    
-    return False
+    return bool(_OPT_RE.match(line))
 
 
 def is_answer(line: str) -> bool:
     """Check if a line contains the answer"""
-    answer_indicators = [
-        'answer', 'correct answer', 'correct option', 
-        'ans:', 'ans.', 'solution', 'correct:'
-    ]
-    
-    line_lower = line.lower()
-    return any(indicator in line_lower for indicator in answer_indicators)
+    return bool(_ANS_IND_RE.search(line))
 
 
 def clean_topic(line: str) -> str:
     """Clean and format topic text"""
     # Remove common prefixes
-    line = re.sub(r'^(chapter|unit|section|topic|part)\s*\d*[\:\.]?\s*', '', line, flags=re.IGNORECASE)
+    line = _CLEAN_TOPIC.sub('', line)
     return line.strip()
 
 
 def clean_question(line: str) -> str:
     """Clean and format question text"""
     # Remove question numbering
-    line = re.sub(r'^(Q|Question)\s*\d*[\.\:\)]\s*', '', line, flags=re.IGNORECASE)
-    line = re.sub(r'^\d+[\.\:\)]\s*', '', line)
+    line = _CLEAN_Q1.sub('', line)
+    line = _CLEAN_Q2.sub('', line)
     return line.strip()
 
 
 def clean_option(line: str) -> str:
     """Clean and format option text"""
     # Remove option markers
-    line = re.sub(r'^[\(\[]?[A-Fa-f\d][\)\.\]]\s*', '', line)
+    line = _CLEAN_OPT.sub('', line)
     return line.strip()
 
 
 def clean_answer(line: str) -> str:
     """Clean and format answer text"""
     # Remove answer indicators
-    line = re.sub(r'^(answer|correct answer|correct option|ans|solution|correct)[\:\.]?\s*', '', line, flags=re.IGNORECASE)
+    line = _CLEAN_ANS.sub('', line)
     return line.strip()
 
 
@@ -310,8 +439,8 @@ def save_question(structured_data: list, topic: str, question: dict,
     # Add options to question
     question['options'] = options
     
-    # Assign image if available
-    if image_index < len(images):
+    # Assign image if available and actually saved to disk
+    if image_index < len(images) and os.path.exists(images[image_index]['path']):
         question['image'] = images[image_index]['path']
     
     # Assign video link if available
@@ -0,0 +1,140 @@
+"""
+Tests for the MCQ extractor module
+"""
+
+import importlib.util
+import sys
+
+import fitz  # PyMuPDF
+import pytest
+
+import extractor
+from extractor import extract_mcqs_from_pdf
+
+
+def write_two_column_pdf(pdf_path: str) -> None:
+    """Write a page with Q1-Q2 in the left column and Q3-Q4 in the right one"""
+    doc = fitz.open()
+    page = doc.new_page()
+
+    # The right column starts a few points lower than the left one
+    for x, y, numbers in ((50, 50, (1, 2)), (320, 53, (3, 4))):
+        for num in numbers:
+            for line in (f"Q{num}. Question {num} text?", "A) one", "B) two", "Answer: A"):
+                page.insert_text((x, y), line, fontsize=10)
+                y += 14
+            y += 20
+
+    doc.save(pdf_path)
+    doc.close()
+
+
+def write_multi_page_pdf(pdf_path: str, page_count: int) -> None:
+    """Write one topic and question, with an image and a video link, per page"""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+    doc = fitz.open()
+
+    for page_num in range(page_count):
+        page = doc.new_page()
+        y = 50
+        for line in (f"CHAPTER {page_num + 1}: SET {page_num + 1}",
+                     f"Q{page_num + 1}. Question {page_num + 1} text?",
+                     "A) one", "B) two", "Answer: B"):
+            page.insert_text((50, y), line, fontsize=10)
+            y += 14
+        # A distinct image per page, so each page has its own xref
+        pixmap.clear_with(page_num)
+        page.insert_image(fitz.Rect(400, 50, 420, 70), pixmap=pixmap)
+        page.insert_link({
+            'kind': fitz.LINK_URI,
+            'from': fitz.Rect(400, 100, 450, 110),
+            'uri': f"https://youtube.com/watch?v={page_num}",
+        })
+
+    doc.save(pdf_path)
+    doc.close()
+
+
+def test_process_pool_matches_sequential_extraction(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "multi_page.pdf")
+    write_multi_page_pdf(pdf_path, 6)
+
+    sequential = extract_mcqs_from_pdf(pdf_path, str(tmp_path))
+
+    # Force three worker processes of two pages each
+    monkeypatch.setattr(extractor, 'PAGES_PER_PROCESS', 2)
+    monkeypatch.setattr(extractor.os, 'cpu_count', lambda: 3)
+    parallel = extract_mcqs_from_pdf(pdf_path, str(tmp_path))
+
+    assert len(sequential) == 6
+    assert parallel == sequential
+
+
+def test_two_column_page_keeps_column_order(tmp_path):
+    pdf_path = str(tmp_path / "two_column.pdf")
+    write_two_column_pdf(pdf_path)
+
+    data = extract_mcqs_from_pdf(pdf_path, str(tmp_path))
+    questions = [q for topic in data for q in topic['questions']]
+
+    assert [q['question'] for q in questions] == [
+        f"Question {num} text?" for num in (1, 2, 3, 4)
+    ]
+    for q in questions:
+        assert q['options'] == ['one', 'two']
+        assert q['answer'] == 'A'
+
+
+# (line, is_topic, is_question, is_option, is_answer)
+CLASSIFIER_CASES = [
+    ("Q1. What is ATP", True, True, False, False),
+    ("Question\xa01. What", True, True, False, False),
+    ("Question\u20031: x", False, True, False, False),
+    ("QUEST\u0130ON 3: x", False, True, False, False),
+    ("\u0661. foo", False, True, True, False),
+    ("Q\u0662. x", True, True, False, False),
+    ("\u0967. \u092a\u094d\u0930\u0936\u094d\u0928", False, True, True, False),
+    ("(\u0661) opt", False, False, True, False),
+    ("(a) Nucleus", False, False, True, False),
+    ("[D] Golgi", True, False, True, False),
+    ("2) a protein", False, True, True, False),
+    ("Correct answer: B", False, False, False, True),
+    ("Solut\u0131on: see notes", False, False, False, True),
+    ("SECTION 2: PHYSICS", True, False, False, False),
+    ("Introduction", True, False, False, False),
+]
+
+
+@pytest.fixture(params=['re', 're2'])
+def engine_extractor(request, monkeypatch):
+    """A fresh copy of the extractor module using the requested regex engine"""
+    if request.param == 're2':
+        pytest.importorskip('re2')
+    else:
+        monkeypatch.setitem(sys.modules, 're2', None)
+
+    spec = importlib.util.spec_from_file_location(
+        f"extractor_{request.param}", extractor.__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module._re_engine.__name__ == request.param
+    return module
+
+
+@pytest.mark.parametrize("line, topic, question, option, answer", CLASSIFIER_CASES)
+def test_classifiers_match_under_both_engines(engine_extractor, line, topic, question,
+                                              option, answer):
+    assert engine_extractor.is_topic(line) == topic
+    assert engine_extractor.is_question(line) == question
+    assert engine_extractor.is_option(line) == option
+    assert engine_extractor.is_answer(line) == answer
+
+
+@pytest.mark.parametrize("line, cleaned", [
+    ("Question\xa01. What is ATP", "What is ATP"),
+    ("Q\u0661. x?", "x?"),
+])
+def test_classifiers_and_cleaners_agree(engine_extractor, line, cleaned):
+    assert engine_extractor.is_question(line)
+    assert engine_extractor.clean_question(line) == cleaned